@@ -9,8 +9,225 @@ Matches real-world coordinates (X, Y, Z) from two input files with floating-poin
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import os
-from typing import List, Tuple, Dict, Set
-from collections import defaultdict
+import threading
+from itertools import product
+from typing import List, Tuple
+
+import numpy as np
+
+# Numba is optional and imported on first use by _load_kernel. The kernel is first
+# launched from the filter thread, and TBB can hang at interpreter exit when initialized
+# outside the main thread, so prefer the other threading layers. Numba reads this
+# setting when it is imported, an existing value from the environment is kept
+os.environ.setdefault('NUMBA_THREADING_LAYER_PRIORITY', 'omp workqueue tbb')
+_kernel = None  # Compiled matching kernel, False when Numba is not installed
+
+# SciPy is optional as well and imported on first use by _load_kdtree
+_kdtree_class = None  # scipy.spatial.cKDTree, False when SciPy is not installed
+
+
+# Record view of (x, y, z) grid cell keys, compared and sorted as single elements. Keys
+# stay float64, an int64 cast overflows for tolerances far below the coordinate scale
+CELL_KEY_DTYPE = np.dtype([('x', np.float64), ('y', np.float64), ('z', np.float64)])
+
+
+def _load_kernel():
+    """
+    Import Numba and compile the matching kernel on first use, keeping Numba's import
+    cost out of GUI startup. Returns the compiled kernel, or None without Numba
+    """
+    global _kernel
+    if _kernel is None:
+        try:
+            import numba
+        except ImportError:  # Numba is optional, matching falls back to NumPy
+            _kernel = False
+            return None
+            
+        # cache=True stores the compiled kernel on disk so only the first run pays for compilation,
+        # which needs a closure over nothing but the numba module. fastmath and no bounds checks
+        # let LLVM unroll the fixed 3-axis test, non-finite rows are filtered out before the kernel
+        # so fastmath's no-NaN/no-inf assumptions hold. nogil=True lets the kernel run alongside
+        # the Tk main thread
+        @numba.njit(parallel=True, cache=True, nogil=True, fastmath=True, boundscheck=False)
+        def match_kernel(gcp_xyz, cp_sorted, cp_index, tolerance):
+            """
+            GCP rows are scanned in parallel. Control points must be sorted by X so each
+            row only scans the slice whose X lies within tolerance, cp_index holds their
+            indices before sorting and the lowest one within tolerance is kept
+            """
+            n = gcp_xyz.shape[0]
+            cp_x = cp_sorted[:, 0]
+            matches = np.full(n, -1, dtype=np.intp)
+            for i in numba.prange(n):
+                gx, gy, gz = gcp_xyz[i, 0], gcp_xyz[i, 1], gcp_xyz[i, 2]
+                lo = np.searchsorted(cp_x, gx - tolerance)
+                hi = np.searchsorted(cp_x, gx + tolerance, side='right')
+                best = -1
+                for j in range(lo, hi):
+                    # Chebyshev distance, one compare instead of three short-circuited ones
+                    if max(abs(gx - cp_sorted[j, 0]), abs(gy - cp_sorted[j, 1]),
+                           abs(gz - cp_sorted[j, 2])) <= tolerance:
+                        if best < 0 or cp_index[j] < best:
+                            best = cp_index[j]
+                matches[i] = best
+            return matches
+            
+        _kernel = match_kernel
+        
+    return _kernel or None
+
+
+def _load_kdtree():
+    """
+    Import SciPy's cKDTree on first use. Returns the class, or None without SciPy
+    """
+    global _kdtree_class
+    if _kdtree_class is None:
+        try:
+            from scipy.spatial import cKDTree
+        except ImportError:  # SciPy is optional, matching falls back to the grid join
+            _kdtree_class = False
+            return None
+        _kdtree_class = cKDTree
+        
+    return _kdtree_class or None
+
+
+def _match_kdtree(kdtree_class, gcp_xyz: np.ndarray, cp_xyz: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    KD-tree matching, joins a tree of the GCP rows with a tree of the control points to
+    find all pairs within tolerance under the Chebyshev (max-abs) metric
+    """
+    # cKDTree rejects NaN and inf, only finite rows are queried
+    matches = np.full(len(gcp_xyz), -1, dtype=np.intp)
+    rows = np.flatnonzero(np.isfinite(gcp_xyz).all(axis=1))
+    if len(rows) == 0:
+        return matches
+    gcp_tree = kdtree_class(gcp_xyz[rows])
+    cp_tree = kdtree_class(cp_xyz)
+    
+    # Widen the bound by one ulp so rounding in the tree never drops a pair exactly at
+    # the tolerance, the exact test below has the final say
+    pairs = gcp_tree.sparse_distance_matrix(cp_tree, np.nextafter(tolerance, np.inf), p=np.inf,
+                                            output_type='ndarray')
+    pairs = pairs[np.abs(gcp_xyz[rows[pairs['i']]] - cp_xyz[pairs['j']]).max(axis=1) <= tolerance]
+    
+    # Keep the lowest control point index of each row, like the other matchers
+    pairs = pairs[np.lexsort((pairs['j'], pairs['i']))]
+    first = np.ones(len(pairs), dtype=bool)
+    first[1:] = pairs['i'][1:] != pairs['i'][:-1]
+    matches[rows[pairs['i'][first]]] = pairs['j'][first]
+    return matches
+
+
+def _match_grid(gcp_xyz: np.ndarray, cp_xyz: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    NumPy hash join on a grid with cell size equal to the tolerance, each GCP row only
+    tests the control points in its own and the 26 neighbouring grid cells
+    """
+    matches = np.full(len(gcp_xyz), -1, dtype=np.intp)
+    rows = np.flatnonzero(np.isfinite(gcp_xyz).all(axis=1))
+    if tolerance > 0:
+        # Cell keys stay float64 (see CELL_KEY_DTYPE), beyond 2**53 neighbouring keys
+        # coincide but coordinates that large are only within tolerance when equal
+        cp_keys = np.floor(cp_xyz / tolerance)
+        gcp_keys = np.floor(gcp_xyz[rows] / tolerance)
+        steps = (-1, 0, 1)
+    else:
+        # Zero tolerance only matches equal coordinates, so they are their own keys
+        cp_keys, gcp_keys = cp_xyz, gcp_xyz[rows]
+        steps = (0,)
+        
+    # Relabel each axis to the index of its distinct control point keys and pack the
+    # labels of a cell into one int64 (mixed radix), plain integers sort and search far
+    # faster than records. Probes on a key no control point has get label -1
+    cp_cells = np.zeros(len(cp_xyz), dtype=np.int64)
+    radix, probe_labels = [], []
+    for axis in range(3):
+        values, labels = np.unique(cp_keys[:, axis], return_inverse=True)
+        cp_cells = cp_cells * len(values) + labels.ravel()
+        radix.append(len(values))
+        axis_labels = {}
+        for step in steps:
+            probe = gcp_keys[:, axis] + step
+            found = np.minimum(np.searchsorted(values, probe), len(values) - 1)
+            axis_labels[step] = np.where(values[found] == probe, found, -1)
+        probe_labels.append(axis_labels)
+        
+    # Control point cells sorted so they can be binary searched
+    order = np.argsort(cp_cells, kind='stable')
+    cp_cells = cp_cells[order]
+    for dx, dy, dz in product(steps, repeat=3):
+        lx, ly, lz = probe_labels[0][dx], probe_labels[1][dy], probe_labels[2][dz]
+        pending = np.flatnonzero((lx >= 0) & (ly >= 0) & (lz >= 0))
+        probe = (lx[pending] * radix[1] + ly[pending]) * radix[2] + lz[pending]
+        lo = np.searchsorted(cp_cells, probe)
+        hi = np.searchsorted(cp_cells, probe, side='right')
+        
+        # Step all rows through the control points of the probed cell together. The stable
+        # sort keeps each cell in index order, so the first hit is the cell's lowest index
+        occupied = hi > lo
+        pending, lo, hi = pending[occupied], lo[occupied], hi[occupied]
+        while len(pending):
+            candidates = order[lo]
+            hit = np.abs(gcp_xyz[rows[pending]] - cp_xyz[candidates]).max(axis=1) <= tolerance
+            current = matches[rows[pending]]
+            better = hit & ((current < 0) | (candidates < current))
+            matches[rows[pending[better]]] = candidates[better]
+            lo += 1
+            left = ~hit & (lo < hi) & ((current < 0) | (candidates < current))
+            pending, lo, hi = pending[left], lo[left], hi[left]
+            
+    return matches
+
+
+def group_control_points(cp_xyz: np.ndarray, tolerance: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Group control points on the keys of a grid with cell size equal to the
+    tolerance (equal coordinates at zero tolerance), each group is represented by its
+    first point in file order
+    Returns: (representatives, group) where group maps every row of cp_xyz to the
+    index of its representative
+    """
+    keys = np.round(cp_xyz / tolerance) if tolerance > 0 else cp_xyz
+    keys = np.ascontiguousarray(keys, dtype=np.float64).view(CELL_KEY_DTYPE).ravel()
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    
+    # Number the groups in file order of their first point
+    order = np.argsort(first, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return np.ascontiguousarray(cp_xyz[first[order]], dtype=np.float64), rank[inverse.ravel()]
+
+
+def match_coordinates(gcp_xyz: np.ndarray, cp_xyz: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Match each GCP coordinate against the control points within tolerance. Every backend
+    credits a row to the lowest-indexed control point within tolerance
+    Returns: index into cp_xyz of the matching control point per GCP row, or -1
+    """
+    if len(gcp_xyz) == 0 or len(cp_xyz) == 0:
+        return np.full(len(gcp_xyz), -1, dtype=np.intp)
+        
+    # Prefer the compiled kernel, then SciPy's KD-tree, then the pure NumPy grid join
+    kernel = _load_kernel()
+    if kernel is None:
+        kdtree_class = _load_kdtree()
+        if kdtree_class is not None:
+            return _match_kdtree(kdtree_class, gcp_xyz, cp_xyz, tolerance)
+        return _match_grid(gcp_xyz, cp_xyz, tolerance)
+        
+    # Sort control points by X so candidates can be narrowed with a binary search
+    order = np.argsort(cp_xyz[:, 0], kind='stable')
+    cp_sorted = np.ascontiguousarray(cp_xyz[order], dtype=np.float64)
+    
+    # Rows with unparsable (NaN) or infinite coordinates never match, the kernel only sees finite rows
+    matches = np.full(len(gcp_xyz), -1, dtype=np.intp)
+    rows = np.flatnonzero(np.isfinite(gcp_xyz).all(axis=1))
+    matches[rows] = kernel(np.ascontiguousarray(gcp_xyz[rows], dtype=np.float64), cp_sorted,
+                           order.astype(np.intp), float(tolerance))
+    return matches
 
 
 class GCPFilter:
@@ -27,6 +244,10 @@ class GCPFilter:
         # Tolerance for coordinate matching (in meters)
         self.tolerance = tk.DoubleVar(value=0.001)
         
+        # Pending status log output, written to the widget by flush_log
+        self._log_buf: List[str] = []
+        self._log_lock = threading.Lock()
+        
         self.setup_ui()
         
     def setup_ui(self):
@@ -80,10 +301,9 @@ class GCPFilter:
         ttk.Label(tolerance_frame, text="meters").pack(side=tk.LEFT, padx=(5, 0))
         
         # Run button
-        ttk.Button(main_frame, text="Run Filter", command=self.run_filter, 
-                  style="Accent.TButton").grid(
-            row=5, column=1, pady=(20, 10), sticky=tk.W
-        )
+        self.run_button = ttk.Button(main_frame, text="Run Filter", command=self.run_filter, 
+                                     style="Accent.TButton")
+        self.run_button.grid(row=5, column=1, pady=(20, 10), sticky=tk.W)
         
         # Status and results section
         ttk.Label(main_frame, text="Status & Results", font=("Arial", 12, "bold")).grid(
@@ -99,6 +319,7 @@ class GCPFilter:
         
         # Initialize status log
         self.log_message("Ready to process GCP data files.")
+        self.flush_log()
         
     def browse_file1(self):
         """Browse for GCP data file"""
@@ -109,6 +330,7 @@ class GCPFilter:
         if filename:
             self.file1_path.set(filename)
             self.log_message(f"Selected GCP data file: {os.path.basename(filename)}")
+            self.flush_log()
             
     def browse_file2(self):
         """Browse for control points file"""
@@ -119,6 +341,7 @@ class GCPFilter:
         if filename:
             self.file2_path.set(filename)
             self.log_message(f"Selected control points file: {os.path.basename(filename)}")
+            self.flush_log()
             
     def browse_output(self):
         """Browse for output file location"""
@@ -130,50 +353,67 @@ class GCPFilter:
         if filename:
             self.output_path.set(filename)
             self.log_message(f"Output will be saved to: {os.path.basename(filename)}")
+            self.flush_log()
             
     def log_message(self, message: str):
-        """Add a message to the status log"""
-        self.status_log.insert(tk.END, f"{message}\n")
+        """Queue a message for the status log, shown on the next flush_log"""
+        with self._log_lock:
+            self._log_buf.append(f"{message}\n")
+            
+    def flush_log(self):
+        """Write all queued messages to the status log in a single update"""
+        if threading.current_thread() is not threading.main_thread():
+            # Tk widgets may only be touched from the main thread
+            self.run_on_ui_thread(self.flush_log)
+            return
+            
+        with self._log_lock:
+            text = ''.join(self._log_buf)
+            self._log_buf.clear()
+        if not text:
+            return
+        self.status_log.insert(tk.END, text)
         self.status_log.see(tk.END)
         self.root.update_idletasks()
         
-    def read_file_with_crs(self, filepath: str) -> Tuple[str, List[List[str]]]:
+    def run_on_ui_thread(self, func, *args):
+        """Schedule func(*args) on the Tk main thread, dropped once the window is closed"""
+        try:
+            self.root.after(0, func, *args)
+        except (RuntimeError, tk.TclError):
+            # The window was closed while the filter thread was still running
+            pass
+            
+    def read_file_with_crs(self, filepath: str, label: str = "data") -> Tuple[str, List[bytes], np.ndarray]:
         """
         Read a tab-delimited file with CRS header
-        Returns: (crs_header, data_rows)
+        Returns: (crs_header, data_lines, coordinates) where data_lines are the unsplit,
+        undecoded data rows and coordinates holds their first 3 columns (X, Y, Z) as an (N, 3) array
         """
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
+            # Keep the data rows as bytes, rows are written back as-is so only the CRS header
+            # ever needs decoding. Every row is kept in memory for the output anyway, so the
+            # file is read in one call and split in bulk rather than memory-mapped
+            with open(filepath, 'rb') as f:
+                header = f.readline()
+                body = f.read()
                 
-            if not lines:
+            if not header:
                 raise ValueError("File is empty")
                 
             # First line is CRS header
-            crs_header = lines[0].strip()
+            crs_header = header.decode('utf-8').strip()
             
-            # Parse data rows (skip empty lines)
-            data_rows = []
-            for line in lines[1:]:
-                line = line.strip()
-                if line:
-                    data_rows.append(line.split('\t'))
-                    
-            return crs_header, data_rows
+            # Data lines (skip empty lines)
+            data_lines = [line for line in (raw.strip() for raw in body.split(b'\n')) if line]
+            del body  # Only the split lines are needed from here on
+            
+            coordinates = self.parse_coordinate_columns(data_lines, label)
+            return crs_header, data_lines, coordinates
             
         except Exception as e:
             raise Exception(f"Error reading file {filepath}: {str(e)}")
             
-    def coordinates_match(self, coord1: Tuple[float, float, float], 
-                         coord2: Tuple[float, float, float]) -> bool:
-        """
-        Check if two coordinate tuples match within tolerance
-        """
-        tolerance = self.tolerance.get()
-        return (abs(coord1[0] - coord2[0]) <= tolerance and
-                abs(coord1[1] - coord2[1]) <= tolerance and
-                abs(coord1[2] - coord2[2]) <= tolerance)
-                
     def parse_coordinates(self, row: List[str], coord_indices: Tuple[int, int, int]) -> Tuple[float, float, float]:
         """
         Parse coordinates from a data row
@@ -186,94 +426,135 @@ class GCPFilter:
         except (ValueError, IndexError) as e:
             raise ValueError(f"Error parsing coordinates: {str(e)}")
             
+    def parse_coordinate_columns(self, data_lines: List[bytes], label: str) -> np.ndarray:
+        """
+        Bulk-parse the X, Y, Z columns (first 3 columns) of the data lines as an (N, 3) array
+        Rows that cannot be parsed are set to NaN so they never match
+        """
+        if not data_lines:
+            return np.empty((0, 3))
+            
+        try:
+            return np.loadtxt(data_lines, delimiter='\t', usecols=(0, 1, 2),
+                              comments=None, ndmin=2, dtype=np.float64)
+        except ValueError:
+            pass
+            
+        # Fall back to row-by-row parsing so invalid rows can be reported and skipped
+        coords = np.full((len(data_lines), 3), np.nan)
+        for i, row in enumerate(line.decode('utf-8', 'replace').split('\t', 3) for line in data_lines):
+            if len(row) >= 3:
+                try:
+                    coords[i] = self.parse_coordinates(row, (0, 1, 2))
+                except ValueError as e:
+                    self.log_message(f"Warning: Skipping invalid {label} row: {e}")
+        return coords
+        
     def run_filter(self):
-        """Main filtering process"""
+        """Validate the inputs and start the filtering process in a worker thread"""
         try:
+            # Read the Tk variables once, the worker thread only gets plain values
+            gcp_path = self.file1_path.get()
+            cp_path = self.file2_path.get()
+            output_path = self.output_path.get()
+            tolerance = float(self.tolerance.get())
+            
             # Validate input files
-            if not self.file1_path.get() or not os.path.exists(self.file1_path.get()):
+            if not gcp_path or not os.path.exists(gcp_path):
                 messagebox.showerror("Error", "Please select a valid GCP data file")
                 return
                 
-            if not self.file2_path.get() or not os.path.exists(self.file2_path.get()):
+            if not cp_path or not os.path.exists(cp_path):
                 messagebox.showerror("Error", "Please select a valid control points file")
                 return
                 
-            if not self.output_path.get():
+            if not output_path:
                 messagebox.showerror("Error", "Please specify an output file path")
                 return
                 
+            if tolerance < 0:
+                messagebox.showerror("Error", "Coordinate tolerance cannot be negative")
+                return
+                
+        except Exception as e:
+            error_msg = f"Error during filtering: {str(e)}"
+            self.log_message(f"❌ {error_msg}")
+            self.flush_log()
+            messagebox.showerror("Error", error_msg)
+            return
+            
+        self.run_button.config(state=tk.DISABLED)
+        threading.Thread(target=self.filter_worker, args=(gcp_path, cp_path, output_path, tolerance),
+                         daemon=True).start()
+        
+    def filter_worker(self, gcp_path: str, cp_path: str, output_path: str, tolerance: float):
+        """Main filtering process, runs outside the Tk main thread"""
+        try:
             self.log_message("Starting filter process...")
             
             # Read input files
             self.log_message("Reading GCP data file...")
-            crs_header1, gcp_data = self.read_file_with_crs(self.file1_path.get())
-            self.log_message(f"Loaded {len(gcp_data)} GCP data rows")
+            self.flush_log()
+            crs_header1, gcp_lines, gcp_xyz = self.read_file_with_crs(gcp_path, "GCP")
+            self.log_message(f"Loaded {len(gcp_lines)} GCP data rows")
             
             self.log_message("Reading control points file...")
-            crs_header2, cp_data = self.read_file_with_crs(self.file2_path.get())
-            self.log_message(f"Loaded {len(cp_data)} control point rows")
+            crs_header2, cp_lines, cp_xyz = self.read_file_with_crs(cp_path, "control point")
+            self.log_message(f"Loaded {len(cp_lines)} control point rows")
             
-            # Parse control points coordinates (assume first 3 columns are X, Y, Z)
-            control_points = set()
-            for row in cp_data:
-                if len(row) >= 3:
-                    try:
-                        coords = self.parse_coordinates(row, (0, 1, 2))
-                        control_points.add(coords)
-                    except ValueError as e:
-                        self.log_message(f"Warning: Skipping invalid control point row: {e}")
-                        
-            self.log_message(f"Parsed {len(control_points)} unique control points")
+            # Control points (assume first 3 columns are X, Y, Z), frozen into a contiguous
+            # array that matching indexes into. Near-duplicates are only merged for statistics
+            cp_array = np.ascontiguousarray(cp_xyz[np.isfinite(cp_xyz).all(axis=1)], dtype=np.float64)
+            unique_cps, cp_group = group_control_points(cp_array, tolerance)
+            self.log_message(f"Parsed {len(unique_cps)} unique control points")
             
             # Filter GCP data
+            if _kernel is None:
+                # The first run of a session imports Numba and loads or compiles the kernels
+                self.log_message("Warming up numerical kernels...")
             self.log_message("Filtering GCP data...")
-            matched_rows = []
-            match_stats = defaultdict(list)  # For statistics
+            self.flush_log()
+            
+            matches = match_coordinates(gcp_xyz, cp_array, tolerance)
+            matched_indices = np.flatnonzero(matches >= 0)
+            matched_lines = [gcp_lines[i] for i in matched_indices.tolist()]
+            
+            # Pictures per control point, only matched rows that have an image filename
+            # (column 5, 0-indexed) are counted. Rows are split only up to that column
+            has_image = np.fromiter((len(line.split(b'\t', 6)) >= 6 for line in matched_lines),
+                                    dtype=bool, count=len(matched_lines))
+            cp_counts = np.bincount(cp_group[matches[matched_indices][has_image]], minlength=len(unique_cps))
+            matched_cps = np.flatnonzero(cp_counts)
+            pics_per_cp = cp_counts[matched_cps]
             
-            for row in gcp_data:
-                if len(row) >= 3:
-                    try:
-                        # Assume first 3 columns are X, Y, Z coordinates
-                        gcp_coords = self.parse_coordinates(row, (0, 1, 2))
-                        
-                        # Check if this GCP matches any control point
-                        for cp_coords in control_points:
-                            if self.coordinates_match(gcp_coords, cp_coords):
-                                matched_rows.append(row)
-                                # Track statistics
-                                if len(row) >= 6:  # Assuming image filename is in column 5 (0-indexed)
-                                    image_name = row[5] if len(row) > 5 else "unknown"
-                                    match_stats[cp_coords].append(image_name)
-                                break
-                    except ValueError as e:
-                        self.log_message(f"Warning: Skipping invalid GCP row: {e}")
-                        
             # Write output file
             self.log_message("Writing output file...")
-            with open(self.output_path.get(), 'w', encoding='utf-8') as f:
-                f.write(crs_header1 + '\n')
-                for row in matched_rows:
-                    f.write('\t'.join(row) + '\n')
+            self.flush_log()
+            # Rows are still undecoded bytes, write them in binary mode with the
+            # platform line ending that text mode would have used
+            newline = os.linesep.encode('ascii')
+            with open(output_path, 'wb') as f:
+                f.write(crs_header1.encode('utf-8') + newline)
+                f.writelines(line + newline for line in matched_lines)
                     
             # Display results and statistics
             self.log_message(f"✅ Filter completed successfully!")
-            self.log_message(f"Matched {len(matched_rows)} rows from {len(gcp_data)} total GCP data rows")
-            self.log_message(f"Matched data saved to: {self.output_path.get()}")
+            self.log_message(f"Matched {len(matched_lines)} rows from {len(gcp_lines)} total GCP data rows")
+            self.log_message(f"Matched data saved to: {output_path}")
             
             # Display detailed statistics
             self.log_message("\n--- STATISTICS ---")
-            if match_stats:
-                total_matched_cps = len(match_stats)
-                total_requested_cps = len(control_points)
+            if len(matched_cps):
+                total_matched_cps = len(matched_cps)
+                total_requested_cps = len(unique_cps)
                 
                 self.log_message(f"Control Points matched: {total_matched_cps}/{total_requested_cps}")
                 
                 # Pictures per control point statistics
-                pics_per_cp = [len(images) for images in match_stats.values()]
-                if pics_per_cp:
-                    min_pics = min(pics_per_cp)
-                    max_pics = max(pics_per_cp)
-                    avg_pics = sum(pics_per_cp) / len(pics_per_cp)
+                if len(pics_per_cp):
+                    min_pics = int(pics_per_cp.min())
+                    max_pics = int(pics_per_cp.max())
+                    avg_pics = float(pics_per_cp.mean())
                     
                     self.log_message(f"Pictures per control point:")
                     self.log_message(f"  • Minimum: {min_pics}")
@@ -281,18 +562,26 @@ class GCPFilter:
                     self.log_message(f"  • Average: {avg_pics:.1f}")
                     
                     # Detailed breakdown
+                    # Lines are formatted up front and queued as one message
                     self.log_message("\nDetailed breakdown:")
-                    for i, (cp_coords, images) in enumerate(match_stats.items(), 1):
-                        self.log_message(f"  CP{i} ({cp_coords[0]:.3f}, {cp_coords[1]:.3f}, {cp_coords[2]:.3f}): {len(images)} pictures")
+                    breakdown = [f"  CP{i} ({x:.3f}, {y:.3f}, {z:.3f}): {pics} pictures"
+                                 for i, ((x, y, z), pics) in enumerate(zip(unique_cps[matched_cps].tolist(),
+                                                                           pics_per_cp.tolist()), 1)]
+                    self.log_message("\n".join(breakdown))
             else:
                 self.log_message("No control points were matched!")
+            self.flush_log()
                 
-            messagebox.showinfo("Success", f"Filter completed!\nMatched {len(matched_rows)} rows.\nSaved to: {os.path.basename(self.output_path.get())}")
+            self.run_on_ui_thread(messagebox.showinfo, "Success", f"Filter completed!\nMatched {len(matched_lines)} rows.\nSaved to: {os.path.basename(output_path)}")
             
         except Exception as e:
             error_msg = f"Error during filtering: {str(e)}"
             self.log_message(f"❌ {error_msg}")
-            messagebox.showerror("Error", error_msg)
+            self.flush_log()
+            self.run_on_ui_thread(messagebox.showerror, "Error", error_msg)
+            
+        finally:
+            self.run_on_ui_thread(lambda: self.run_button.config(state=tk.NORMAL))
 
 
 def main():
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Equivalence check of the matching backends against a brute-force reference
+
+Run with: python -m unittest test_gcp_filter
+"""
+
+import unittest
+
+import numpy as np
+
+import gcp_filter
+
+
+def brute_force_matches(gcp_xyz: np.ndarray, cp_xyz: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Lowest control point index within tolerance per GCP row, or -1
+    """
+    within = np.abs(gcp_xyz[:, None, :] - cp_xyz[None, :, :]).max(axis=2) <= tolerance
+    return np.where(within.any(axis=1), within.argmax(axis=1), -1)
+
+
+def random_case(rng: np.random.Generator, tolerance: float):
+    """
+    Control points on a coarse lattice, so neighbours often lie within tolerance of
+    the same GCP row, and GCP rows scattered around them plus a few non-finite rows
+    """
+    cp_xyz = rng.integers(0, 5, (int(rng.integers(1, 40)), 3)) * 0.0007 + 70000.0
+    gcp_xyz = cp_xyz[rng.integers(0, len(cp_xyz), 200)]
+    gcp_xyz = gcp_xyz + rng.choice([0.0, tolerance, -tolerance, 0.0004, 0.0015], gcp_xyz.shape)
+    gcp_xyz[rng.integers(0, 200, 3), rng.integers(0, 3, 3)] = rng.choice([np.nan, np.inf, -np.inf], 3)
+    return gcp_xyz, cp_xyz
+
+
+class MatchEquivalenceTest(unittest.TestCase):
+    TOLERANCES = (0.0, 1e-20, 0.001, 0.0025)
+
+    def check_backend(self, match):
+        rng = np.random.default_rng(0)
+        for tolerance in self.TOLERANCES:
+            for _ in range(50):
+                gcp_xyz, cp_xyz = random_case(rng, tolerance)
+                np.testing.assert_array_equal(match(gcp_xyz, cp_xyz, tolerance),
+                                              brute_force_matches(gcp_xyz, cp_xyz, tolerance))
+
+    def test_grid(self):
+        self.check_backend(gcp_filter._match_grid)
+
+    def test_kdtree(self):
+        kdtree_class = gcp_filter._load_kdtree()
+        if kdtree_class is None:
+            self.skipTest("SciPy is not installed")
+        self.check_backend(lambda g, c, t: gcp_filter._match_kdtree(kdtree_class, g, c, t))
+
+    def test_kernel(self):
+        if gcp_filter._load_kernel() is None:
+            self.skipTest("Numba is not installed")
+        self.check_backend(gcp_filter.match_coordinates)
+
+    def test_lowest_index_wins(self):
+        # The nearest control point is not the lowest-indexed one within tolerance
+        cp_xyz = np.array([[0.0, 0.0, 0.0], [0.0015, 0.0, 0.0]])
+        gcp_xyz = np.array([[0.0009, 0.0, 0.0]])
+        self.assert_all_backends(gcp_xyz, cp_xyz, 0.001, [0])
+
+    def test_tiny_tolerance_groups(self):
+        # Grid keys of projected coordinates at this tolerance are far beyond the int64 range
+        cp_xyz = np.array([[72432.19567, 451442.0833, 3.309333],
+                           [72366.77367, 451500.445, 7.224],
+                           [72432.19568, 451442.0833, 3.309333]])
+        representatives, group = gcp_filter.group_control_points(cp_xyz, 1e-20)
+        np.testing.assert_array_equal(representatives, cp_xyz)
+        np.testing.assert_array_equal(group, [0, 1, 2])
+        self.assert_all_backends(cp_xyz, cp_xyz, 1e-20, [0, 1, 2])
+
+    def assert_all_backends(self, gcp_xyz, cp_xyz, tolerance, expected):
+        np.testing.assert_array_equal(gcp_filter._match_grid(gcp_xyz, cp_xyz, tolerance), expected)
+        kdtree_class = gcp_filter._load_kdtree()
+        if kdtree_class is not None:
+            np.testing.assert_array_equal(
+                gcp_filter._match_kdtree(kdtree_class, gcp_xyz, cp_xyz, tolerance), expected)
+        np.testing.assert_array_equal(gcp_filter.match_coordinates(gcp_xyz, cp_xyz, tolerance), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()